@@ -1,106 +1,240 @@
+import asyncio
 import azure.functions as func
 from datetime import datetime
-import json
+import functools
+import httpx
 import logging
+import orjson
 import os
-import requests
+import random
+from types import MappingProxyType
+from typing import Dict, Optional, Tuple
 import pycountry
-import time
 
 app = func.FunctionApp()
 
-def wait_for_company_association(contact_id, headers, max_retries=5, delay=2):
+# Verbose request/response bodies are logged at DEBUG; set HUBSPOT_LOG_LEVEL=DEBUG to see them.
+# Unrecognized values fall back to INFO rather than failing at import
+_LOG_LEVEL = os.environ.get("HUBSPOT_LOG_LEVEL", "INFO").upper()
+if not isinstance(logging.getLevelName(_LOG_LEVEL), int):
+    _LOG_LEVEL = "INFO"
+logging.getLogger("hubspot_function").setLevel(_LOG_LEVEL)
+
+# HubSpot token and auth headers are resolved once per worker at cold start
+_TOKEN = os.environ.get("HUBSPOT_TOKEN")
+if not _TOKEN:
+    logging.getLogger("hubspot_function").error("HubSpot token not set in environment variables")
+_AUTH_HEADERS = {
+    "Authorization": f"Bearer {_TOKEN}",
+    "Content-Type": "application/json"
+} if _TOKEN else None
+
+# HubSpot endpoints; per-object URLs are filled in with str.format
+_CONTACTS_URL = "https://api.hubapi.com/crm/v3/objects/contacts"
+_CONTACT_URL = _CONTACTS_URL + "/{email}"
+_CONTACT_UPDATE_URL = _CONTACT_URL + "?idProperty=email"
+_ASSOCIATIONS_URL = "https://api.hubapi.com/crm/v4/objects/contacts/{contact_id}/associations/companies"
+_COMPANY_URL = "https://api.hubapi.com/crm/v3/objects/companies/{company_id}"
+
+# Shared async HTTP client so calls to api.hubapi.com reuse keep-alive connections
+# and polling waits don't hold a worker thread
+_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+    timeout=30
+)
+
+# Response headers shared by every reply
+_CORS_HEADERS = {"Access-Control-Allow-Origin": "*"}
+_JSON_HEADERS = {**_CORS_HEADERS, "Content-Type": "application/json"}
+_OPTIONS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Authorization, User-Agent"
+}
+
+# UserDetails fields that must be present and non-empty
+_REQUIRED_FIELDS = ("Email", "FirstName", "LastName")
+
+# Marketplace offer titles (sent without spaces) mapped to HubSpot solution values
+_SOLUTION_MAP = MappingProxyType({
+    "BPACRM365": "BPA CRM 365",
+    "BPAMedical365": "BPA Medical 365",
+    "BPAQuality365": "BPA Quality 365",
+    "CRMandProjectManagementbyBPA": "CRM & Project Management by BPA",
+    "QualityandRiskManagementbyBPA": "Quality & Risk Management by BPA",
+    "Solutionbuilder": "Solution builder",
+})
+
+# Countries handled by the BPA US sales office
+_FILTERED_CC = frozenset({
+    # North America
+    "AG", "AI", "AW", "BS", "BB", "BZ", "BM", "CA", "CR", "CU", "CW", "DM", "DO",
+    "SV", "GD", "GP", "GT", "HT", "HN", "JM", "MQ", "MX", "MS", "NI", "PA", "PR",
+    "KN", "LC", "MF", "PM", "VC", "SX", "TT", "US", "VG", "VI",
+    # Oceania
+    "AS", "AU", "CK", "FJ", "PF", "GU", "KI", "MH", "FM", "NR", "NC", "NZ", "NU",
+    "NF", "MP", "PW", "PG", "PN", "WS", "SB", "TK", "TO", "TV", "VU", "WF",
+    # South America
+    "AR", "BO", "BR", "CL", "CO", "EC", "FK", "GF", "GY", "PY", "PE", "SR", "UY", "VE"
+})
+
+# Countries classified as market type "A"
+_A_RATED_CC = frozenset({
+    "US", "CA", "AU", "NZ", "GB", "DE", "FR", "NL",
+    "SE", "CH", "NO", "FI", "DK", "BE", "AT", "JP",
+    "KR", "SG"
+})
+
+@functools.lru_cache(maxsize=512)
+def _country_by_alpha2(code: str) -> Optional[pycountry.db.Country]:
+    """
+    Look up a pycountry record by its alpha-2 code, memoized per worker
+    Returns None if code is empty or unknown
+    """
+    return pycountry.countries.get(alpha_2=code) if code else None
+
+@functools.lru_cache(maxsize=256)
+def _derive_company_fields(country_code: str) -> Tuple[str, str, str]:
+    """
+    Derive sales routing fields from an alpha-2 country code
+    Returns (sales_office, market_type, sales_account_manager)
+    """
+    sales_office = "BPA US" if country_code in _FILTERED_CC else "BPA CH"
+    market_type = "A" if country_code in _A_RATED_CC else "B"
+    sales_account_manager = (
+        "Sebastien Rocco" if sales_office == "BPA US" else "Damien Emery"
+    )
+    return sales_office, market_type, sales_account_manager
+
+def _company_properties(country_code: str) -> Dict[str, str]:
+    """
+    Build the company properties for a country code
+    Also the source of the routing fields copied onto the contact
+    """
+    sales_office, market_type, sales_account_manager = _derive_company_fields(country_code)
+    properties = {
+        "bpa_sales_office": sales_office,
+        "market_type": market_type,
+        "sales_account_manager": sales_account_manager,
+        "country_region_code": country_code
+    }
+
+    # Add country name if available
+    country = _country_by_alpha2(country_code)
+    if country:
+        properties["country"] = country.name
+    return properties
+
+def _jittered_backoff(attempt: int, base: float, cap: float = 30) -> float:
+    """
+    Full-jitter exponential backoff: random wait in [0, min(cap, base * 2^attempt)]
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def _retry_after_seconds(response: httpx.Response, cap: float = 30) -> Optional[float]:
+    """
+    Read a server-provided wait hint from the Retry-After header
+    Returns seconds to wait (capped), or None if absent or not numeric
+    """
+    hint = response.headers.get("Retry-After")
+    if hint is None:
+        return None
+    try:
+        return min(cap, max(0.0, float(hint)))
+    except ValueError:
+        return None
+
+async def wait_for_company_association(
+    contact_id: str, headers: Dict[str, str], max_retries: int = 5, delay: float = 2
+) -> Optional[str]:
     """
     Wait for company to be created and associated with contact
+    Honors HubSpot's Retry-After hint when present; otherwise delay is the
+    backoff base in seconds and waits are jittered to avoid retry bursts
     Returns company_id if found, None otherwise
     """
     logger = logging.getLogger("hubspot_function")
     
     for attempt in range(max_retries):
         try:
-            associations_url = f"https://api.hubapi.com/crm/v4/objects/contacts/{contact_id}/associations/companies"
-            associations_response = requests.get(associations_url, headers=headers, timeout=30)
+            associations_url = _ASSOCIATIONS_URL.format(contact_id=contact_id)
+            associations_response = await _client.get(associations_url, headers=headers)
             
             if associations_response.status_code == 200:
-                associations_data = associations_response.json()
+                associations_data = orjson.loads(associations_response.content)
                 if associations_data.get("results"):
-                    company_id = associations_data["results"][0]["toObjectId"]
+                    # v4 returns an integer id; v3 lookups return strings
+                    company_id = str(associations_data["results"][0]["toObjectId"])
                     logger.info(f"Company ID found on attempt {attempt + 1}: {company_id}")
                     return company_id
             
             if attempt < max_retries - 1:  # Don't sleep on last attempt
-                logger.info(f"Company not found on attempt {attempt + 1}, waiting {delay} seconds...")
-                time.sleep(delay)
-                delay *= 1.5  # Exponential backoff
+                backoff = _retry_after_seconds(associations_response)
+                if backoff is None:
+                    backoff = _jittered_backoff(attempt, delay)
+                logger.info(f"Company not found on attempt {attempt + 1}, waiting {backoff:.2f} seconds...")
+                await asyncio.sleep(backoff)
                 
         except Exception as e:
             logger.error(f"Error checking for company on attempt {attempt + 1}: {str(e)}")
             if attempt < max_retries - 1:
-                time.sleep(delay)
+                await asyncio.sleep(_jittered_backoff(attempt, delay))
     
     logger.warning("Company association not found after all retry attempts")
     return None
 
-def update_company_properties(company_id, user_country, headers):
+async def get_company_for_contact_email(email: str, headers: Dict[str, str]) -> Optional[str]:
     """
-    Update company properties based on user country
-    Returns True if successful, False otherwise
+    Fetch the company already associated with an existing contact, by email
+    Returns company_id if found, None otherwise
     """
     logger = logging.getLogger("hubspot_function")
-    
+
     try:
-        # Get country object
-        country = pycountry.countries.get(alpha_2=user_country) if user_country else None
-        
-        filtered_country_codes = [
-            # North America
-            "AG", "AI", "AW", "BS", "BB", "BZ", "BM", "CA", "CR", "CU", "CW", "DM", "DO",
-            "SV", "GD", "GP", "GT", "HT", "HN", "JM", "MQ", "MX", "MS", "NI", "PA", "PR",
-            "KN", "LC", "MF", "PM", "VC", "SX", "TT", "US", "VG", "VI",
-            # Oceania
-            "AS", "AU", "CK", "FJ", "PF", "GU", "KI", "MH", "FM", "NR", "NC", "NZ", "NU",
-            "NF", "MP", "PW", "PG", "PN", "WS", "SB", "TK", "TO", "TV", "VU", "WF",
-            # South America
-            "AR", "BO", "BR", "CL", "CO", "EC", "FK", "GF", "GY", "PY", "PE", "SR", "UY", "VE"
-        ]
-
-        a_rated_countries = [
-            "US", "CA", "AU", "NZ", "GB", "DE", "FR", "NL",
-            "SE", "CH", "NO", "FI", "DK", "BE", "AT", "JP",
-            "KR", "SG"
-        ]
-
-        sales_office = "BPA US" if user_country in filtered_country_codes else "BPA CH"
-        market_type = "A" if user_country in a_rated_countries else "B"
-        sales_account_manager = (
-            "Sebastien Rocco" if sales_office == "BPA US" else "Damien Emery"
+        contact_url = _CONTACT_URL.format(email=email)
+        contact_response = await _client.get(
+            contact_url,
+            headers=headers,
+            params={"idProperty": "email", "associations": "companies"}
         )
 
-        company_update_data = {
-            "properties": {
-                "bpa_sales_office": sales_office,
-                "market_type": market_type,
-                "sales_account_manager": sales_account_manager,
-                "country_region_code": user_country
-            }
-        }
-        
-        # Add country name if available
-        if country:
-            company_update_data["properties"]["country"] = country.name
+        if contact_response.status_code == 200:
+            companies = orjson.loads(contact_response.content).get("associations", {}).get("companies", {})
+            if companies.get("results"):
+                company_id = companies["results"][0]["id"]
+                logger.info(f"Existing company association found: {company_id}")
+                return company_id
 
-        company_update_url = f"https://api.hubapi.com/crm/v3/objects/companies/{company_id}"
+    except Exception as e:
+        logger.error(f"Error checking for existing company association: {str(e)}")
+
+    return None
+
+async def update_company_properties(
+    company_id: str, properties: Dict[str, str], headers: Dict[str, str]
+) -> bool:
+    """
+    Update company with the given properties (see _company_properties)
+    Returns True if successful, False otherwise
+    """
+    logger = logging.getLogger("hubspot_function")
+    
+    try:
+        company_update_data = {"properties": properties}
+
+        company_update_url = _COMPANY_URL.format(company_id=company_id)
         logger.info(f"Updating company {company_id}...")
 
-        company_update_response = requests.patch(
+        company_update_response = await _client.patch(
             company_update_url,
             headers=headers,
-            json=company_update_data,
-            timeout=30
+            json=company_update_data
         )
 
         logger.info(f"Company update status: {company_update_response.status_code}")
-        logger.info(f"Company update response: {company_update_response.text}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Company update response: %s", company_update_response.text)
 
         if company_update_response.status_code == 200:
             logger.info("Company updated successfully")
@@ -121,112 +255,74 @@ def update_company_properties(company_id, user_country, headers):
         return False
 
 @app.route(route="HubspotAdd", auth_level=func.AuthLevel.ANONYMOUS)
-def HubspotAdd(req: func.HttpRequest) -> func.HttpResponse:
+async def HubspotAdd(req: func.HttpRequest) -> func.HttpResponse:
     logger = logging.getLogger("hubspot_function")
-    logger.setLevel(logging.INFO)
 
     try:
         logger.info("--- Incoming Request ---")
-        logger.info(f"Timestamp: {datetime.utcnow().isoformat()}Z")
+        timestamp = datetime.utcnow().isoformat()
+        logger.info(f"Timestamp: {timestamp}Z")
         logger.info(f"Method: {req.method}")
-        logger.info(f"Headers: {dict(req.headers)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Headers: %s", dict(req.headers))
 
         # Handle CORS preflight
         if req.method == "OPTIONS":
             return func.HttpResponse(
                 "",
                 status_code=200,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "Content-Type, Authorization, User-Agent"
-                }
+                headers=_OPTIONS_HEADERS
             )
 
         # Only allow POST
         if req.method != "POST":
             logger.warning(f"Invalid method: {req.method}")
             return func.HttpResponse(
-                json.dumps({"message": "Only POST method allowed"}),
+                orjson.dumps({"message": "Only POST method allowed"}),
                 status_code=405,
-                mimetype="application/json",
-                headers={"Access-Control-Allow-Origin": "*"}
+                headers=_JSON_HEADERS
             )
 
         # Read request body
         try:
-            body = req.get_body().decode("utf-8")
-            logger.info(f"Body: {body}")
-            data = json.loads(body)
-        except json.JSONDecodeError as e:
+            body = req.get_body()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Body: %s", body.decode("utf-8", errors="replace"))
+            data = orjson.loads(body)
+        except orjson.JSONDecodeError as e:
             logger.error(f"JSON decode error: {str(e)}")
             return func.HttpResponse(
-                json.dumps({"message": "Invalid JSON format"}),
+                orjson.dumps({"message": "Invalid JSON format"}),
                 status_code=400,
-                mimetype="application/json",
-                headers={"Access-Control-Allow-Origin": "*"}
+                headers=_JSON_HEADERS
             )
 
         # Validate UserDetails exists
         if "UserDetails" not in data:
             logger.error("Missing UserDetails")
             return func.HttpResponse(
-                json.dumps({"message": "UserDetails is required"}),
+                orjson.dumps({"message": "UserDetails is required"}),
                 status_code=400,
-                mimetype="application/json",
-                headers={"Access-Control-Allow-Origin": "*"}
+                headers=_JSON_HEADERS
             )
 
         user = data["UserDetails"]
-        required_fields = ["Email", "FirstName", "LastName"]
-        for field in required_fields:
-            if not user.get(field):
-                logger.error(f"Missing required field: {field}")
-                return func.HttpResponse(
-                    json.dumps({"message": f"Required field missing: {field}"}),
-                    status_code=400,
-                    mimetype="application/json",
-                    headers={"Access-Control-Allow-Origin": "*"}
-                )
-
-        # Mapping for values without spaces
-        solution_map = {
-            "BPACRM365": "BPA CRM 365",
-            "BPAMedical365": "BPA Medical 365",
-            "BPAQuality365": "BPA Quality 365",
-            "CRMandProjectManagementbyBPA": "CRM & Project Management by BPA",
-            "QualityandRiskManagementbyBPA": "Quality & Risk Management by BPA",
-            "Solutionbuilder": "Solution builder",
-        }
+        missing_field = next((field for field in _REQUIRED_FIELDS if not user.get(field)), None)
+        if missing_field:
+            logger.error(f"Missing required field: {missing_field}")
+            return func.HttpResponse(
+                orjson.dumps({"message": f"Required field missing: {missing_field}"}),
+                status_code=400,
+                headers=_JSON_HEADERS
+            )
 
         # Get raw value from user
         raw_solution = data.get("OfferTitle", "")
-        solution_value = solution_map.get(raw_solution, raw_solution)
-
-        country = None
-        if user.get("Country", ""):
-            country = pycountry.countries.get(alpha_2=user.get("Country", ""))
-
-        filtered_country_codes = [
-            # North America
-            "AG", "AI", "AW", "BS", "BB", "BZ", "BM", "CA", "CR", "CU", "CW", "DM", "DO",
-            "SV", "GD", "GP", "GT", "HT", "HN", "JM", "MQ", "MX", "MS", "NI", "PA", "PR",
-            "KN", "LC", "MF", "PM", "VC", "SX", "TT", "US", "VG", "VI",
-            # Oceania
-            "AS", "AU", "CK", "FJ", "PF", "GU", "KI", "MH", "FM", "NR", "NC", "NZ", "NU",
-            "NF", "MP", "PW", "PG", "PN", "WS", "SB", "TK", "TO", "TV", "VU", "WF",
-            # South America
-            "AR", "BO", "BR", "CL", "CO", "EC", "FK", "GF", "GY", "PY", "PE", "SR", "UY", "VE"
-        ]
-
-        a_rated_countries = [
-            "US", "CA", "AU", "NZ", "GB", "DE", "FR", "NL",
-            "SE", "CH", "NO", "FI", "DK", "BE", "AT", "JP",
-            "KR", "SG"  
-        ]
-        
-        sales_office = "BPA US" if user.get("Country", "") in filtered_country_codes else "BPA CH"
-        market_type = "A" if user.get("Country", "") in a_rated_countries else "B"
+        solution_value = _SOLUTION_MAP.get(raw_solution, raw_solution)
+
+        country_code = user.get("Country", "")
+        company_properties = _company_properties(country_code)
+
         # Prepare HubSpot data
         hubspot_data = {
             "properties": {
@@ -236,103 +332,102 @@ def HubspotAdd(req: func.HttpRequest) -> func.HttpResponse:
                 "phone": user.get("Phone", ""),
                 "company": user.get("Company", ""),
                 "jobtitle": user.get("Title", ""),
-                "country_code": user.get("Country", ""),
+                "country_code": country_code,
                 "which_solution_are_you_interested_in_": solution_value,
                 "lifecyclestage": "marketingqualifiedlead",
                 "hs_content_membership_notes": data.get("Description", ""),
                 "lead_source": "AzureMarketplace",
                 "contact_origin": "Marketplace",
                 "account_type": "Inbound Lead",
-                "bpa_sales_office": sales_office,
-                "market_type": market_type,
-                "country_region_code": user.get("Country", "")
+                "bpa_sales_office": company_properties["bpa_sales_office"],
+                "market_type": company_properties["market_type"],
+                "country_region_code": country_code
                 }
         }
         
         # Add country name if available
-        if country:
-            hubspot_data["properties"]["country"] = country.name
-            hubspot_data["properties"]["country_name"] = country.name
+        if "country" in company_properties:
+            hubspot_data["properties"]["country"] = company_properties["country"]
+            hubspot_data["properties"]["country_name"] = company_properties["country"]
 
-        # HubSpot token from environment
-        token = os.environ.get("HUBSPOT_TOKEN")
-        if not token:
+        # HubSpot token was read at cold start
+        if not _AUTH_HEADERS:
             logger.error("HubSpot token not set in environment variables")
             return func.HttpResponse(
-                json.dumps({"message": "Server misconfiguration: missing token"}),
+                orjson.dumps({"message": "Server misconfiguration: missing token"}),
                 status_code=500,
-                mimetype="application/json",
-                headers={"Access-Control-Allow-Origin": "*"}
+                headers=_JSON_HEADERS
             )
 
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
+        headers = _AUTH_HEADERS
 
         # Try creating contact
-        create_url = "https://api.hubapi.com/crm/v3/objects/contacts"
         logger.info("Sending POST to HubSpot...")
-        r = requests.post(create_url, headers=headers, json=hubspot_data, timeout=30)
+        r = await _client.post(_CONTACTS_URL, headers=headers, json=hubspot_data)
         logger.info(f"HubSpot POST status: {r.status_code}")
-        logger.info(f"HubSpot POST response: {r.text}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("HubSpot POST response: %s", r.text)
 
         contact_created = False
+        company_id = None
         
         if r.status_code == 400:
             logger.error("HubSpot error 400")
             return func.HttpResponse(
-                json.dumps({"message": r.text}),
+                orjson.dumps({"message": r.text}),
                 status_code=400,
-                mimetype="application/json",
-                headers={"Access-Control-Allow-Origin": "*"}
+                headers=_JSON_HEADERS
             )
         # If conflict (contact exists), try update
         elif r.status_code == 409:
             email = user["Email"]
-            update_url = f"https://api.hubapi.com/crm/v3/objects/contacts/{email}?idProperty=email"
+            update_url = _CONTACT_UPDATE_URL.format(email=email)
             
             logger.info("Contact already exists (409). Preparing to update contact...")
             logger.info(f"PATCH URL: {update_url}")
-            logger.info(f"Payload for update: {json.dumps(hubspot_data)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Payload for update: %s", orjson.dumps(hubspot_data).decode())
 
+            # Look up the existing company association alongside the update;
+            # the lookup is cancelled if the update fails
+            company_lookup = asyncio.ensure_future(get_company_for_contact_email(email, headers))
             try:
-                r = requests.patch(update_url, headers=headers, json=hubspot_data, timeout=30)
+                r = await _client.patch(update_url, headers=headers, json=hubspot_data)
                 logger.info(f"HubSpot PATCH status: {r.status_code}")
-                logger.info(f"HubSpot PATCH response: {r.text}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("HubSpot PATCH response: %s", r.text)
             except Exception as patch_err:
+                company_lookup.cancel()
                 logger.error(f"PATCH request failed: {patch_err}")
                 return func.HttpResponse(
-                    json.dumps({"message": "PATCH update failed", "error": str(patch_err)}),
+                    orjson.dumps({"message": "PATCH update failed", "error": str(patch_err)}),
                     status_code=500,
-                    mimetype="application/json",
-                    headers={"Access-Control-Allow-Origin": "*"}
+                    headers=_JSON_HEADERS
                 )
             if r.status_code == 400:
+                company_lookup.cancel()
                 logger.error("HubSpot PATCH returned error 400")
                 return func.HttpResponse(
-                    json.dumps({"message": r.text}),
+                    orjson.dumps({"message": r.text}),
                     status_code=400,
-                    mimetype="application/json",
-                    headers={"Access-Control-Allow-Origin": "*"}
+                    headers=_JSON_HEADERS
             )
+            company_id = await company_lookup
         else:
             contact_created = True  # New contact was created
 
-        contact_id = r.json()["id"]
+        contact_id = orjson.loads(r.content)["id"]
 
         # Wait for company association (with retry logic)
-        # Only wait if we created a new contact (company automation triggered)
+        # Only wait if we created a new contact (company automation triggered);
+        # updated contacts already had their association fetched with the PATCH
         if contact_created:
             logger.info("New contact created, waiting for company association...")
-            company_id = wait_for_company_association(contact_id, headers, max_retries=5, delay=2)
-        else:
-            logger.info("Contact updated, checking for existing company association...")
-            company_id = wait_for_company_association(contact_id, headers, max_retries=1, delay=0)
+            company_id = await wait_for_company_association(contact_id, headers, max_retries=5, delay=2)
 
         # Update company fields if company exists
         if company_id:
-            success = update_company_properties(company_id, user.get("Country", ""), headers)
+            success = await update_company_properties(company_id, company_properties, headers)
             if success:
                 logger.info("Company update completed successfully")
             else:
@@ -342,21 +437,19 @@ def HubspotAdd(req: func.HttpRequest) -> func.HttpResponse:
 
         # Return success
         return func.HttpResponse(
-            json.dumps({
+            orjson.dumps({
                 "message": "Lead processed successfully",
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": timestamp,
                 "company_updated": company_id is not None
             }),
             status_code=200,
-            mimetype="application/json",
-            headers={"Access-Control-Allow-Origin": "*"}
+            headers=_JSON_HEADERS
         )
 
     except Exception as e:
         logger.exception("Unhandled error")
         return func.HttpResponse(
-            json.dumps({"message": "Internal server error", "error": str(e)}),
+            orjson.dumps({"message": "Internal server error", "error": str(e)}),
             status_code=500,
-            mimetype="application/json",
-            headers={"Access-Control-Allow-Origin": "*"}
+            headers=_JSON_HEADERS
         )
\ No newline at end of file